@@ -1,27 +1,68 @@
 import sys
 import os
+import re
 import csv
+import heapq
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 curr_dir = os.path.dirname(os.path.abspath(__file__))
 
-from ietfdata.datatracker import DataTracker, DTBackendLive
+from ietfdata.datatracker import DataTracker, DTBackendLive, DTBackendArchive
 
-dt = DataTracker(DTBackendLive())
+# The datatracker API has no bulk author listing, so each RFC costs one request against
+# the live backend; pointing IETFDATA_ARCHIVE at a local archive (SQLite) answers
+# the same lookups from disk
+archive_file = os.environ.get("IETFDATA_ARCHIVE")
+dt = DataTracker(DTBackendArchive(sqlite_file=archive_file) if archive_file else DTBackendLive())
 rfc_doctype = dt.document_type_from_slug("rfc")
 
-print("Fetching all RFC documents...")
-all_rfcs = list(dt.documents(doctype=rfc_doctype))
-print(f"Total RFCs found: {len(all_rfcs)}")
+# Author lookups are blocking HTTP requests, so they are made in parallel,
+# one chunk of RFCs at a time so we stop soon after reaching 150
+FETCH_WORKERS = 32
+FETCH_CHUNK = 64
 
 def get_rfc_number(doc):
+    # Names without the "rfc" prefix map to 0 and are scanned last; a malformed number after "rfc" raises ValueError
+    name = doc.name
+    return int(name[3:]) if name.startswith('rfc') else 0
+
+print("Fetching all RFC documents...")
+# documents() has no ordering option, so every RFC is fetched; a heap then hands them
+# out newest first without ordering the ones we never reach (a full sort would)
+# Entries are decorated once with the RFC number, so the heap compares plain ints,
+# and the index breaks ties so two Documents are never compared with each other
+rfc_heap = [(-get_rfc_number(doc), i, doc) for i, doc in enumerate(dt.documents(doctype=rfc_doctype))]
+heapq.heapify(rfc_heap)
+print(f"Total RFCs found: {len(rfc_heap)}")
+
+def canonical_affiliation(aff):
+    # "Cisco Systems, Inc." and "cisco systems inc" are the same affiliation
+    return re.sub(r'[^\w]+', ' ', aff.lower()).strip()
+
+def newest_first(heap):
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+def fetch_authors(doc):
+    # document_authors() is a lazy generator, so run the requests here in the worker thread
     try:
-        name = doc.name if hasattr(doc, 'name') else ''
-        if name.startswith('rfc'):
-            return int(name[3:])
-        return 0
-    except:
-        return 0
+        return list(dt.document_authors(doc))
+    # Only network failures are skipped; requests' exceptions derive from OSError,
+    # as do ConnectionError and TimeoutError
+    except OSError:
+        return None
 
-all_rfcs.sort(key=get_rfc_number, reverse=True)
+def with_authors(docs):
+    if archive_file:
+        # Local lookups gain nothing from threads, and the SQLite connection is tied to this one
+        for doc in docs:
+            yield doc, fetch_authors(doc)
+        return
+    
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+        while chunk := list(islice(docs, FETCH_CHUNK)):
+            # map() keeps the newest-first order of the chunk
+            yield from zip(chunk, ex.map(fetch_authors, chunk))
 
 print(f"Processing RFCs from newest to oldest to get 150 unique affiliations...")
 
@@ -30,34 +71,33 @@ unique_affiliations = set()
 output_rows = []
 rfcs_processed = 0
 
-for doc in all_rfcs:
-    try:
-        rfc_number = doc.name if hasattr(doc, 'name') else 'Unknown'
-        authors = dt.document_authors(doc)
-        
-        if authors:
-            for a in authors:
-                if hasattr(a, 'affiliation') and a.affiliation:
-                    aff = a.affiliation
-                    if isinstance(aff, str) and aff.strip():
-                        clean_aff = aff.strip()
-                        
-                        # Only add if this affiliation is new
-                        if clean_aff not in unique_affiliations:
-                            unique_affiliations.add(clean_aff)
-                            output_rows.append([rfc_number, clean_aff])
-                            
-                            # Stop when we reach 150 unique affiliations
-                            if len(unique_affiliations) >= 150:
-                                break
-            
-            if len(unique_affiliations) >= 150:
-                break
-        
-        rfcs_processed += 1
-
-    except Exception as e:
+for doc, authors in with_authors(newest_first(rfc_heap)):
+    if authors is None:
         continue
+    
+    rfc_number = doc.name
+    
+    for a in authors:
+        aff = getattr(a, 'affiliation', None)
+        if aff and isinstance(aff, str) and aff.strip():
+            clean_aff = aff.strip()
+            canon = canonical_affiliation(clean_aff)
+            
+            # Only add if this affiliation is new, ignoring case, punctuation and spacing
+            # (a set only grows on a new key, so add() doubles as the membership test)
+            seen = len(unique_affiliations)
+            unique_affiliations.add(canon)
+            if len(unique_affiliations) > seen:
+                output_rows.append([rfc_number, clean_aff])
+                
+                # Stop when we reach 150 unique affiliations
+                if len(unique_affiliations) >= 150:
+                    break
+    
+    if len(unique_affiliations) >= 150:
+        break
+    
+    rfcs_processed += 1
 
 # Save CSV file
 output_file = os.path.join(curr_dir, "affiliations_raw.csv")
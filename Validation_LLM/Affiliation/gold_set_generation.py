@@ -1,16 +1,42 @@
 import os
+import re
 import csv
 import json
 import time
-from openai import OpenAI
+import pickle
+import sqlite3
+import hashlib
+import asyncio
+import argparse
+import httpx
+from pathlib import Path
+from itertools import islice
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APITimeoutError, APIConnectionError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 from dotenv import load_dotenv
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Upper bound on chat completions in flight at once
+MAX_CONCURRENT_REQUESTS = 10
+# HTTP connection pool, sized above MAX_CONCURRENT_REQUESTS so connections are always reused
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+# Affiliations normalized per chat completion in the bulk pass
+BULK_SIZE = 20
+# Seconds between status checks on a submitted batch job
+BATCH_POLL_INTERVAL = 30
+# Semantic cache: reuse a normalization when the embeddings' cosine similarity exceeds this
+EMBEDDING_MODEL = "text-embedding-3-small"
+SEMANTIC_THRESHOLD = 0.92
 
-curr_dir = os.path.dirname(os.path.abspath(__file__))
-input_file = os.path.join(curr_dir, "affiliations_raw.csv")
-output_file = os.path.join(curr_dir, "affiliation_gold_set.csv")
+# Paths are resolved once at import and reused as Path objects
+CURR_DIR = Path(__file__).resolve().parent
+INPUT_FILE = CURR_DIR / "affiliations_raw.csv"
+OUTPUT_FILE = CURR_DIR / "affiliation_gold_set.csv"
+CONSISTENCY_FILE = CURR_DIR / "consistency_check.csv"
+CACHE_FILE = CURR_DIR / ".llm_cache.sqlite"
+SEMANTIC_INDEX_FILE = CURR_DIR / ".semantic_cache.faiss"
+SEMANTIC_ENTRIES_FILE = CURR_DIR / ".semantic_cache.pkl"
 
 SYSTEM_PROMPT = """You are an expert in data normalization and entity resolution. Your task is to normalize raw affiliation strings to standardized organization names.
 You will be provided with a mapping dictionary of raw affiliation variants and their corresponding normalized names.
@@ -39,52 +65,361 @@ If the input is "Independent researcher", return "Unknown".
 Use fuzzy matching or logical rules if needed, but ensure high precision."""
 
 
-def normalize_affiliation(affiliation, model="gpt-4.1", temperature=0):
+class DiskCache:
+    """Persistent key/value store for LLM responses, backed by SQLite"""
+    
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+    
+    def get(self, key):
+        row = self.conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def set(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, value))
+        self.conn.commit()
+
+
+cache = DiskCache(CACHE_FILE)
+
+
+class SemanticCache:
+    """Nearest-neighbour cache over affiliation embeddings, persisted as a FAISS index plus a pickle"""
+    
+    def __init__(self, index_path, entries_path, threshold=SEMANTIC_THRESHOLD):
+        # Optional dependencies, only needed with --semantic-cache
+        import faiss
+        import numpy as np
+        self.faiss = faiss
+        self.np = np
+        self.index_path = index_path
+        self.entries_path = entries_path
+        self.threshold = threshold
+        self.index = None
+        self.entries = []  # (raw, normalized) for each vector in the index, same order
+        
+        if index_path.exists() and entries_path.exists():
+            self.index = faiss.read_index(str(index_path))
+            with open(entries_path, 'rb') as f:
+                self.entries = pickle.load(f)
+    
+    def _vector(self, embedding):
+        # Inner product over L2-normalized vectors is cosine similarity
+        vector = self.np.asarray([embedding], dtype='float32')
+        self.faiss.normalize_L2(vector)
+        return vector
+    
+    def lookup(self, embedding):
+        if self.index is None or self.index.ntotal == 0:
+            return None
+        scores, ids = self.index.search(self._vector(embedding), 1)
+        if scores[0][0] > self.threshold:
+            return self.entries[ids[0][0]][1]
+        return None
+    
+    def add(self, embedding, raw, normalized):
+        vector = self._vector(embedding)
+        if self.index is None:
+            self.index = self.faiss.IndexFlatIP(vector.shape[1])
+        self.index.add(vector)
+        self.entries.append((raw, normalized))
+    
+    def save(self):
+        if self.index is None:
+            return
+        self.faiss.write_index(self.index, str(self.index_path))
+        with open(self.entries_path, 'wb') as f:
+            pickle.dump(self.entries, f)
+
+
+def canonical_affiliation(affiliation):
+    # "Cisco Systems, Inc." and "cisco systems inc" are the same affiliation
+    return re.sub(r'[^\w]+', ' ', affiliation.lower()).strip()
+
+
+def cache_key(affiliation, model, temperature, bulk=False):
+    # Bulk answers come from a different prompt shape, so they never stand in for a single-request answer
+    shape = "bulk" if bulk else "single"
+    return hashlib.sha256(f"{model}|{temperature}|{shape}|{SYSTEM_PROMPT}|{affiliation}".encode()).hexdigest()
+
+
+def async_client():
+    # TCP/TLS connections in the pool are reused by every request made through this client
+    # Retries are left to create_completion alone; the SDK would otherwise retry under it
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        max_retries=0,
+        http_client=httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    )
+
+
+@retry(
+    retry=retry_if_exception_type((RateLimitError, APITimeoutError, APIConnectionError)),
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(6),
+    reraise=True
+)
+async def create_completion(client, **kwargs):
+    """Chat completion with exponential backoff on 429 responses, timeouts and dropped connections"""
+    return await client.chat.completions.create(**kwargs)
+
+
+# Structured output: the API guarantees the reply is exactly {"normalized": "..."}
+NORMALIZATION_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "normalized_affiliation",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"normalized": {"type": "string"}},
+            "required": ["normalized"],
+            "additionalProperties": False
+        }
+    }
+}
+
+
+def request_body(affiliation, model, temperature):
+    """Chat completion parameters, shared by the live and the Batch API paths"""
+    user_prompt = f"""Task: Normalize these affiliations:{affiliation}"""
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        "temperature": temperature,
+        # A short organization name plus the {"normalized": ...} wrapper
+        "max_tokens": 40,
+        "response_format": NORMALIZATION_FORMAT
+    }
+
+
+def bulk_request_body(affiliations, model, temperature):
+    """One request normalizing several affiliations, answered as a JSON object input -> normalized"""
+    user_prompt = ("Normalize each of these affiliations. Return strict JSON mapping input→normalized:\n"
+                   + json.dumps(affiliations, ensure_ascii=False))
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        "temperature": temperature,
+        "max_tokens": 30 * len(affiliations) + 20,
+        "response_format": {"type": "json_object"}
+    }
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+async def normalize_affiliation(client, affiliation, model="gpt-4.1", temperature=0):
+    key = cache_key(affiliation, model, temperature)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    
     try:
-        user_prompt = f"""Task: Normalize these affiliations:{affiliation}"""
+        response = await create_completion(client, **request_body(affiliation, model, temperature))
+        result = json.loads(response.choices[0].message.content)["normalized"].strip()
+    except Exception as e:
+        print(f"  Error processing '{affiliation}': {e}")
+        return "ERROR"
+    
+    cache.set(key, result)
+    return result
+
+
+async def normalize_affiliations_bulk(client, affiliations, model="gpt-4.1", temperature=0, bypass_cache=False):
+    """Normalize a chunk of affiliations in one request, returns {affiliation: normalized}"""
+    try:
+        response = await create_completion(client, **bulk_request_body(affiliations, model, temperature))
+        mapping = json.loads(response.choices[0].message.content)
+    except Exception as e:
+        print(f"  Error processing chunk of {len(affiliations)} affiliations: {e}")
+        return {}
+    
+    # Affiliations the model dropped or renamed are left out and retried one by one by the caller
+    results = {}
+    for affiliation in affiliations:
+        normalized = mapping.get(affiliation)
+        if isinstance(normalized, str) and normalized.strip():
+            results[affiliation] = normalized.strip()
+            # The consistency check leaves the cache alone so it only ever measures fresh responses
+            if not bypass_cache:
+                cache.set(cache_key(affiliation, model, temperature, bulk=True), results[affiliation])
+    return results
+
+
+async def run_triples(affiliations, temperature=0):
+    """Normalize the affiliations 3 times through the bulk prompt with the cache bypassed, returns [(run_1, run_2, run_3)]"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    
+    # A fresh client per event loop: pooled connections cannot outlive asyncio.run()
+    async with async_client() as client:
+        async def bounded(chunk):
+            async with semaphore:
+                return await normalize_affiliations_bulk(client, chunk, temperature=temperature, bypass_cache=True)
         
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=temperature,
-            max_tokens=150
-        )
+        async def run():
+            results = {}
+            tasks = [bounded(chunk) for chunk in chunked(dict.fromkeys(affiliations), BULK_SIZE)]
+            for chunk_results in await asyncio.gather(*tasks):
+                results.update(chunk_results)
+            return results
+        
+        runs = await asyncio.gather(*(run() for _ in range(3)))
+    
+    # An affiliation a run dropped counts as "ERROR", like a failed single request
+    return [tuple(run.get(a, "ERROR") for run in runs) for a in affiliations]
+
+
+async def run_all_bulk(affiliations, model="gpt-4.1", temperature=0, semantic_cache=None):
+    """Normalize all affiliations BULK_SIZE per request, at most MAX_CONCURRENT_REQUESTS requests at a time"""
+    results = {}
+    pending = []
+    for affiliation in dict.fromkeys(affiliations):
+        cached = cache.get(cache_key(affiliation, model, temperature, bulk=True))
+        if cached is None:
+            cached = cache.get(cache_key(affiliation, model, temperature))
+        if cached is not None:
+            results[affiliation] = cached
+        else:
+            pending.append(affiliation)
+    
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    
+    async with async_client() as client:
+        async def bounded(call, *args):
+            async with semaphore:
+                return await call(client, *args, model=model, temperature=temperature)
         
-        result = response.choices[0].message.content.strip()
+        if semantic_cache is not None and pending:
+            try:
+                response = await client.embeddings.create(model=EMBEDDING_MODEL, input=pending)
+                embeddings = dict(zip(pending, (d.embedding for d in response.data)))
+            except Exception as e:
+                print(f"  Error embedding affiliations, skipping semantic cache: {e}")
+                semantic_cache = None
         
-        if result.startswith('```json'):
-            result = result.replace('```json', '').replace('```', '').strip()
-        elif result.startswith('```'):
-            result = result.replace('```', '').strip()
+        if semantic_cache is not None and pending:
+            remaining = []
+            for affiliation in pending:
+                hit = semantic_cache.lookup(embeddings[affiliation])
+                if hit is not None:
+                    results[affiliation] = hit
+                else:
+                    remaining.append(affiliation)
+            print(f"Semantic cache hits: {len(pending) - len(remaining)}/{len(pending)}")
+            pending = remaining
         
-        # Parse JSON response
-        try:
-            json_result = json.loads(result)
-            # Extract the normalized value from the JSON
-            if isinstance(json_result, dict):
-                # Should have the affiliation as key
-                return json_result.get(affiliation, list(json_result.values())[0] if json_result else result)
-            else:
-                return result
-        except json.JSONDecodeError:
-            return result
+        tasks = [bounded(normalize_affiliations_bulk, chunk) for chunk in chunked(pending, BULK_SIZE)]
+        for chunk_results in await asyncio.gather(*tasks):
+            results.update(chunk_results)
         
-    except Exception as e:
-        print(f"  Error processing '{affiliation}': {e}")
-        return "ERROR"
+        missing = [a for a in pending if a not in results]
+        if missing:
+            print(f"Retrying {len(missing)} affiliations individually...")
+            tasks = [bounded(normalize_affiliation, a) for a in missing]
+            results.update(zip(missing, await asyncio.gather(*tasks)))
+    
+    if semantic_cache is not None:
+        for affiliation in pending:
+            if results[affiliation] != "ERROR":
+                semantic_cache.add(embeddings[affiliation], affiliation, results[affiliation])
+        semantic_cache.save()
+    
+    return [results[a] for a in affiliations]
+
+
+def batch_normalize(affiliations, model="gpt-4.1", temperature=0):
+    """Normalize affiliations through the OpenAI Batch API (half price, up to 24h turnaround)"""
+    results = {}
+    pending = []
+    for affiliation in dict.fromkeys(affiliations):
+        cached = cache.get(cache_key(affiliation, model, temperature))
+        if cached is not None:
+            results[affiliation] = cached
+        else:
+            pending.append(affiliation)
+    
+    if not pending:
+        return results
+    
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    
+    # custom_id is the index into pending: rfc_id is not unique across affiliations
+    lines = [
+        json.dumps({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": request_body(affiliation, model, temperature)
+        })
+        for i, affiliation in enumerate(pending)
+    ]
+    batch_input = client.files.create(
+        file=("affiliation_batch.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=batch_input.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    print(f"Submitted batch {batch.id} with {len(pending)} requests")
+    
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(BATCH_POLL_INTERVAL)
+        batch = client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        print(f"  Batch status: {batch.status} ({counts.completed if counts else 0}/{len(pending)} done)")
+    
+    if batch.status != "completed" or not batch.output_file_id:
+        print(f"ERROR: Batch {batch.id} finished with status '{batch.status}'")
+        return results
+    
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        record = json.loads(line)
+        affiliation = pending[int(record['custom_id'])]
+        response = record.get('response')
+        if record.get('error') or not response or response['status_code'] != 200:
+            print(f"  Error processing '{affiliation}': {record.get('error') or response}")
+            continue
+        
+        message = response['body']['choices'][0]['message']
+        if message.get('content') is None:
+            # A strict-schema refusal carries a refusal message and no content to parse
+            print(f"  Error processing '{affiliation}': refused: {message.get('refusal')}")
+            continue
+        
+        try:
+            result = json.loads(message['content'])["normalized"].strip()
+        except (json.JSONDecodeError, KeyError) as e:
+            # Only possible when the reply was cut off at max_tokens
+            print(f"  Error processing '{affiliation}': {e}")
+            continue
+        cache.set(cache_key(affiliation, model, temperature), result)
+        results[affiliation] = result
+    
+    return results
 
 
 def load_existing_gold_set():
     """Load existing gold_set.csv if it exists and has data"""
-    if not os.path.exists(output_file):
+    if not OUTPUT_FILE.exists():
         return None
     
     try:
         validated = []
-        with open(output_file, 'r', encoding='utf-8') as f:
+        with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row in reader:
                 validated.append(row)
@@ -137,11 +472,14 @@ def print_statistics(validated):
             return
         
         print(f"Running consistency check on 20 correct samples...")
-        print(f"Testing each sample 3 times to measure variance...\n")
+        print(f"Testing each sample 3 times through the bulk prompt to measure variance...\n")
         
         import random
         sample_cases = random.sample(correct_cases, min(20, len(correct_cases)))
         
+        # The labeled answers come from the bulk prompt, so the 3 runs go through it as well
+        all_runs = asyncio.run(run_triples([case['original_affiliation'] for case in sample_cases], temperature=0))
+        
         consistency_results = []
         inconsistent_count = 0
         total_variance = 0
@@ -154,11 +492,7 @@ def print_statistics(validated):
             print(f"[{idx}/20] RFC: {rfc_id} - Testing: {original}")
             
             # Run 3 times with temperature=0 for deterministic results
-            runs = []
-            for run in range(3):
-                result = normalize_affiliation(original, temperature=0)
-                runs.append(result)
-                time.sleep(0.5)
+            runs = all_runs[idx - 1]
             
             # Check consistency
             all_same = all(r == runs[0] for r in runs)
@@ -208,14 +542,13 @@ def print_statistics(validated):
         print(f"  (0 = all same, 1 = 2 different, 2 = all different)")
         
         # Save consistency check results
-        consistency_file = os.path.join(curr_dir, "consistency_check.csv")
         try:
-            with open(consistency_file, 'w', newline='', encoding='utf-8') as f:
+            with open(CONSISTENCY_FILE, 'w', newline='', encoding='utf-8') as f:
                 fieldnames = ['rfc_id', 'original_affiliation', 'human_normalized', 'run_1', 'run_2', 'run_3', 'unique_outputs', 'variance', 'consistent']
                 writer = csv.DictWriter(f, fieldnames=fieldnames)
                 writer.writeheader()
                 writer.writerows(consistency_results)
-            print(f"\nConsistency check results saved to: {consistency_file}")
+            print(f"\nConsistency check results saved to: {CONSISTENCY_FILE}")
         except Exception as e:
             print(f"ERROR saving consistency check results: {e}")
     else:
@@ -225,14 +558,14 @@ def print_statistics(validated):
         print(f"Not enough correct samples for consistency check (need 20, have {len(correct_cases)})")
 
 
-def validate_normalizations():
+def validate_normalizations(use_batch=False, use_semantic_cache=False):
     # Check if gold_set.csv already exists and has data
     existing_data = load_existing_gold_set()
     if existing_data is not None:
         print(f"\n{'='*70}")
         print(f"EXISTING GOLD SET FOUND")
         print(f"{'='*70}\n")
-        print(f"Found {len(existing_data)} entries in {output_file}")
+        print(f"Found {len(existing_data)} entries in {OUTPUT_FILE}")
         print(f"Proceeding directly to statistics and analysis...\n")
         print_statistics(existing_data)
         return
@@ -241,8 +574,8 @@ def validate_normalizations():
     print(f"NO EXISTING GOLD SET FOUND")
     print(f"Proceeding with human validation...\n")
     
-    if not os.path.exists(input_file):
-        print(f"ERROR: Input file not found: {input_file}")
+    if not INPUT_FILE.exists():
+        print(f"ERROR: Input file not found: {INPUT_FILE}")
         return
     
     if not os.getenv("OPENAI_API_KEY"):
@@ -253,7 +586,7 @@ def validate_normalizations():
     # Read raw affiliations and validate columns
     affiliations = []
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
+        with open(INPUT_FILE, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             fieldnames = reader.fieldnames
             
@@ -281,6 +614,8 @@ def validate_normalizations():
     print(f"{'='*70}")
     print(f"Total affiliations: {len(affiliations)}")
     print(f"Model: gpt-4.1")
+    if use_batch:
+        print(f"Mode: Batch API (results may take up to 24h)")
     
     validated = []
     
@@ -297,82 +632,116 @@ def validate_normalizations():
     print(f"  - Type 'quit' to save and exit")
     print(f"{'='*70}\n")
     
-    # Process each affiliation
-    for i in range(len(affiliations)):
-        rfc_id = affiliations[i]['rfc_id']
-        original = affiliations[i]['original_affiliation']
-        
-        print(f"\n[{i+1}/{len(affiliations)}] " + "="*50)
-        print(f"RFC: {rfc_id}")
-        print(f"Processing: {original}")
-        
-        # Get LLM normalization
-        print("Getting LLM normalization...")
-        llm_normalized = normalize_affiliation(original, temperature=0)
+    # Fetch every LLM normalization up front so the review loop below never waits on the API
+    print(f"Getting LLM normalizations for {len(affiliations)} affiliations...")
+    # Variants differing only in case, punctuation or spacing share a single LLM normalization
+    cluster_map = {}
+    for a in affiliations:
+        cluster_map.setdefault(canonical_affiliation(a['original_affiliation']), []).append(a['original_affiliation'])
+    representatives = [raws[0] for raws in cluster_map.values()]
+    print(f"{len(representatives)} distinct affiliations after canonicalization")
+    
+    if use_batch:
+        llm_results = batch_normalize(representatives, temperature=0)
+    else:
+        semantic_cache = SemanticCache(SEMANTIC_INDEX_FILE, SEMANTIC_ENTRIES_FILE) if use_semantic_cache else None
+        llm_results = dict(zip(representatives, asyncio.run(
+            run_all_bulk(representatives, temperature=0, semantic_cache=semantic_cache)
+        )))
+    llm_normalizations = {
+        raw: llm_results.get(raws[0], "ERROR")
+        for raws in cluster_map.values()
+        for raw in raws
+    }
+    
+    # Write the header once, then append one row per validation
+    try:
+        f = open(OUTPUT_FILE, 'w', newline='', encoding='utf-8')
+    except Exception as e:
+        print(f"ERROR saving output file: {e}")
+        return
+    
+    with f:
+        fieldnames = ['rfc_id', 'original_affiliation', 'llm_normalized', 'human_normalized', 'label']
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        f.flush()
         
-        if llm_normalized == "ERROR":
-            print("ERROR: Failed to get LLM normalization. Skipping this entry.")
-            response = input("Press ENTER to continue or 'quit' to exit: ")
-            if response.lower() == 'quit':
+        # Process each affiliation
+        for i in range(len(affiliations)):
+            rfc_id = affiliations[i]['rfc_id']
+            original = affiliations[i]['original_affiliation']
+            
+            print(f"\n[{i+1}/{len(affiliations)}] " + "="*50)
+            print(f"RFC: {rfc_id}")
+            print(f"Processing: {original}")
+            
+            llm_normalized = llm_normalizations[original]
+            
+            if llm_normalized == "ERROR":
+                print("ERROR: Failed to get LLM normalization. Skipping this entry.")
+                response = input("Press ENTER to continue or 'quit' to exit: ")
+                if response.lower() == 'quit':
+                    break
+                continue
+            
+            print(f"\nOriginal:       {original}")
+            print(f"LLM Normalized: {llm_normalized}")
+            print("-"*60)
+            
+            # Get human validation
+            human_input = input("Correct normalization (ENTER if LLM correct, or type correction): ").strip()
+            
+            # Handle quit
+            if human_input.lower() == 'quit':
+                print(f"\nSaving progress... Validated {len(validated)} out of {len(affiliations)}.")
                 break
-            continue
-        
-        print(f"\nOriginal:       {original}")
-        print(f"LLM Normalized: {llm_normalized}")
-        print("-"*60)
-        
-        # Get human validation
-        human_input = input("Correct normalization (ENTER if LLM correct, or type correction): ").strip()
-        
-        # Handle quit
-        if human_input.lower() == 'quit':
-            print(f"\nSaving progress... Validated {len(validated)} out of {len(affiliations)}.")
-            break
-        
-        # Determine correct normalization and label
-        if not human_input:
-            # User pressed ENTER - LLM is correct
-            human_normalized = llm_normalized
-            label = 'r'
-            print("✓ LLM correct (label = r)")
-        else:
-            # User typed something - LLM is wrong
-            human_normalized = human_input
-            label = 'w'
-            print("✗ LLM incorrect (label = w)")
-        
-        # Add to validated list
-        validated.append({
-            'rfc_id': rfc_id,
-            'original_affiliation': original,
-            'llm_normalized': llm_normalized,
-            'human_normalized': human_normalized,
-            'label': label
-        })
-        
-        # Save after each validation
-        try:
-            with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                fieldnames = ['rfc_id', 'original_affiliation', 'llm_normalized', 'human_normalized', 'label']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(validated)
-        except Exception as e:
-            print(f"ERROR saving output file: {e}")
-            return
-        
-        # Small delay to avoid rate limits
-        if i < len(affiliations) - 1:
-            time.sleep(0.3)
+            
+            # Determine correct normalization and label
+            if not human_input:
+                # User pressed ENTER - LLM is correct
+                human_normalized = llm_normalized
+                label = 'r'
+                print("✓ LLM correct (label = r)")
+            else:
+                # User typed something - LLM is wrong
+                human_normalized = human_input
+                label = 'w'
+                print("✗ LLM incorrect (label = w)")
+            
+            # Add to validated list
+            validated.append({
+                'rfc_id': rfc_id,
+                'original_affiliation': original,
+                'llm_normalized': llm_normalized,
+                'human_normalized': human_normalized,
+                'label': label
+            })
+            
+            # Save after each validation, synced so a crash loses at most the current entry
+            try:
+                writer.writerow(validated[-1])
+                f.flush()
+                os.fsync(f.fileno())
+            except Exception as e:
+                print(f"ERROR saving output file: {e}")
+                return
     
     # Final summary and statistics
     if validated:
         print_statistics(validated)
     
     print(f"\n{'='*70}")
-    print(f"Gold set saved to: {output_file}")
+    print(f"Gold set saved to: {OUTPUT_FILE}")
     print(f"{'='*70}\n")
 
 
 if __name__ == "__main__":
-    validate_normalizations()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build and evaluate the affiliation normalization gold set")
+    parser.add_argument("--batch", action="store_true",
+                        help="normalize through the OpenAI Batch API (50%% cheaper, up to 24h turnaround)")
+    parser.add_argument("--semantic-cache", action="store_true",
+                        help="reuse the normalization of near-identical affiliations seen in earlier runs "
+                             "(needs faiss and numpy; ignored with --batch)")
+    args = parser.parse_args()
+    validate_normalizations(use_batch=args.batch, use_semantic_cache=args.semantic_cache)
\ No newline at end of file
@@ -1,28 +1,68 @@
 import sys
 import os
 import csv
+import heapq
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 import time
 curr_dir = os.path.dirname(os.path.abspath(__file__))
 
-from ietfdata.datatracker import DataTracker, DTBackendLive
+# EXTRACT_DEBUG=1 dumps the author objects of the first 3 RFCs
+DEBUG = os.environ.get('EXTRACT_DEBUG') == '1'
 
-dt = DataTracker(DTBackendLive())
+from ietfdata.datatracker import DataTracker, DTBackendLive, DTBackendArchive
+
+# The datatracker API has no bulk author listing, so each RFC costs one request against
+# the live backend; pointing IETFDATA_ARCHIVE at a local archive (SQLite) answers
+# the same lookups from disk
+archive_file = os.environ.get("IETFDATA_ARCHIVE")
+dt = DataTracker(DTBackendArchive(sqlite_file=archive_file) if archive_file else DTBackendLive())
 rfc_doctype = dt.document_type_from_slug("rfc")
 
-print("Fetching all RFC documents...")
-all_rfcs = list(dt.documents(doctype=rfc_doctype))
-print(f"Total RFCs found: {len(all_rfcs)}")
+# Author lookups are blocking HTTP requests, so they are made in parallel,
+# one chunk of RFCs at a time so we stop soon after reaching 150
+FETCH_WORKERS = 32
+FETCH_CHUNK = 64
 
 def get_rfc_number(doc):
+    # Names without the "rfc" prefix map to 0 and are scanned last; a malformed number after "rfc" raises ValueError
+    name = doc.name
+    return int(name[3:]) if name.startswith('rfc') else 0
+
+print("Fetching all RFC documents...")
+# documents() has no ordering option, so every RFC is fetched; a heap then hands them
+# out newest first without ordering the ones we never reach (a full sort would)
+# Entries are decorated once with the RFC number, so the heap compares plain ints,
+# and the index breaks ties so two Documents are never compared with each other
+rfc_heap = [(-get_rfc_number(doc), i, doc) for i, doc in enumerate(dt.documents(doctype=rfc_doctype))]
+heapq.heapify(rfc_heap)
+print(f"Total RFCs found: {len(rfc_heap)}")
+
+def newest_first(heap):
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+def fetch_authors(doc):
+    # document_authors() is a lazy generator, so run the requests here in the worker thread
     try:
-        name = doc.name if hasattr(doc, 'name') else ''
-        if name.startswith('rfc'):
-            return int(name[3:])
-        return 0
-    except:
-        return 0
+        return list(dt.document_authors(doc))
+    # Only network failures are skipped; requests' exceptions derive from OSError,
+    # as do ConnectionError and TimeoutError
+    except OSError as e:
+        print(f"Error processing {doc.name}: {e}")
+        return None
 
-all_rfcs.sort(key=get_rfc_number, reverse=True)
+def with_authors(docs):
+    if archive_file:
+        # Local lookups gain nothing from threads, and the SQLite connection is tied to this one
+        for doc in docs:
+            yield doc, fetch_authors(doc)
+        return
+    
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+        while chunk := list(islice(docs, FETCH_CHUNK)):
+            # map() keeps the newest-first order of the chunk
+            yield from zip(chunk, ex.map(fetch_authors, chunk))
 
 print(f"Processing RFCs to get 150 unique addresses...")
 
@@ -31,62 +71,53 @@ unique_addresses = set()
 output_rows = []
 rfcs_processed = 0
 
-for doc in all_rfcs:
-    try:
-        rfc_number = doc.name if hasattr(doc, 'name') else 'Unknown'
-        authors = dt.document_authors(doc)
-        
-        rfcs_processed += 1
-        
-        if rfcs_processed <= 3:
-            if authors:
-                for i, a in enumerate(authors):
-                    print(f"  Author {i}: {dir(a)}")
-                    if hasattr(a, 'address'):
-                        print(f"    address: {a.address}")
-                    if hasattr(a, 'country'):
-                        print(f"    country: {a.country}")
-                    if hasattr(a, 'person'):
-                        print(f"    person: {a.person}")
-                        if a.person and hasattr(a.person, 'address'):
-                            print(f"      person.address: {a.person.address}")
-            else:
-                print(f"  No authors found")
-        
+for doc, authors in with_authors(newest_first(rfc_heap)):
+    if authors is None:
+        continue
+    
+    rfc_number = doc.name
+    
+    rfcs_processed += 1
+    
+    if DEBUG and rfcs_processed <= 3:
         if authors:
-            for a in authors:
-                address = None
-                
-                if hasattr(a, 'address') and a.address:
-                    address = a.address
-                elif hasattr(a, 'country') and a.country:
-                    address = a.country
-                elif hasattr(a, 'person') and a.person:
-                    if hasattr(a.person, 'address') and a.person.address:
-                        address = a.person.address
-                    elif hasattr(a.person, 'country') and a.person.country:
-                        address = a.person.country
+            for i, a in enumerate(authors):
+                print(f"  Author {i}: {dir(a)}")
+                if hasattr(a, 'address'):
+                    print(f"    address: {a.address}")
+                if hasattr(a, 'country'):
+                    print(f"    country: {a.country}")
+                if hasattr(a, 'person'):
+                    print(f"    person: {a.person}")
+                    if a.person and hasattr(a.person, 'address'):
+                        print(f"      person.address: {a.person.address}")
+        else:
+            print(f"  No authors found")
+    
+    for a in authors:
+        person = getattr(a, 'person', None)
+        address = (getattr(a, 'address', None) or getattr(a, 'country', None)
+                   or getattr(person, 'address', None) or getattr(person, 'country', None))
+        
+        if address and isinstance(address, str) and address.strip():
+            clean_addr = address.strip()
+            
+            # Only add if this address is new
+            # (a set only grows on a new key, so add() doubles as the membership test)
+            seen = len(unique_addresses)
+            unique_addresses.add(clean_addr)
+            if len(unique_addresses) > seen:
+                output_rows.append([rfc_number, clean_addr])
+                if len(unique_addresses) % 10 == 0:
+                    print(f"Found {len(unique_addresses)}/150 unique addresses (latest from {rfc_number})")
                 
-                if address and isinstance(address, str) and address.strip():
-                    clean_addr = address.strip()
-                    
-                    # Only add if this address is new
-                    if clean_addr not in unique_addresses:
-                        unique_addresses.add(clean_addr)
-                        output_rows.append([rfc_number, clean_addr])
-                        print(f"Found {len(unique_addresses)}/150 unique addresses from {rfc_number}")
-                        
-                        if len(unique_addresses) >= 150:
-                            break
-                    
+                if len(unique_addresses) >= 150:
                     break
             
-            if len(unique_addresses) >= 150:
-                break
-
-    except Exception as e:
-        print(f"Error processing {doc.name}: {e}")
-        continue
+            break
+    
+    if len(unique_addresses) >= 150:
+        break
 
 output_file = os.path.join(curr_dir, "address_raw.csv")
 
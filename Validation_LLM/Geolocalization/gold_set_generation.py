@@ -1,72 +1,439 @@
 import os
+import re
+import sys
 import csv
-import json
 import time
-from openai import OpenAI
+import logging
+import sqlite3
+import hashlib
+import weakref
+import asyncio
+import argparse
+from pathlib import Path
+from itertools import islice
+import orjson
+from aiolimiter import AsyncLimiter
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APITimeoutError, APIConnectionError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 from dotenv import load_dotenv
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Upper bound on chat completions in flight at once
+MAX_CONCURRENT_REQUESTS = 20
+# Token bucket on request starts: bursts go straight through, and requests only wait
+# once the script nears this many per minute
+MAX_REQUESTS_PER_MINUTE = 500
+# Addresses sent together in one bulk request
+BULK_SIZE = 20
+# Seconds between status checks on a submitted batch job
+BATCH_POLL_INTERVAL = 30
+# --fuzzy-dedup: addresses whose embeddings' cosine similarity exceeds this share one normalization
+EMBEDDING_MODEL = "text-embedding-3-small"
+FUZZY_THRESHOLD = 0.98
 
-curr_dir = os.path.dirname(os.path.abspath(__file__))
-input_file = os.path.join(curr_dir, "address_raw.csv")
-output_file = os.path.join(curr_dir, "address_gold_set.csv")
-error_file = os.path.join(curr_dir, "address_error_samples.csv")
-consistency_file = os.path.join(curr_dir, "address_consistency_check.csv")
+# An AsyncLimiter must not outlive its event loop, and each asyncio.run() starts a new one
+_rate_limiters = weakref.WeakKeyDictionary()
+
+
+def rate_limiter():
+    loop = asyncio.get_running_loop()
+    if loop not in _rate_limiters:
+        _rate_limiters[loop] = AsyncLimiter(MAX_REQUESTS_PER_MINUTE, 60)
+    return _rate_limiters[loop]
+
+
+# Progress and results go through one logger instead of bare print() calls
+logger = logging.getLogger("goldset")
+logger.addHandler(logging.StreamHandler(sys.stdout))
+logger.setLevel(logging.INFO)
+logger.propagate = False
+BANNER = "=" * 70
+
+# Paths are resolved once at import and reused as Path objects
+CURR_DIR = Path(__file__).resolve().parent
+INPUT_FILE = CURR_DIR / "address_raw.csv"
+OUTPUT_FILE = CURR_DIR / "address_gold_set.csv"
+ERROR_FILE = CURR_DIR / "address_error_samples.csv"
+CONSISTENCY_FILE = CURR_DIR / "address_consistency_check.csv"
+# LLM answers waiting for review, written by normalize_all.py and read by review.py
+PREVALIDATED_FILE = CURR_DIR / "address_prevalidated.csv"
+CACHE_FILE = CURR_DIR / ".llm_cache.sqlite"
+
+# Column order of address_gold_set.csv, address_error_samples.csv and address_consistency_check.csv
+GOLD_FIELDS = ('rfc_id', 'original_address', 'llm_normalized_country', 'llm_normalized_continent',
+               'human_normalized_country', 'human_normalized_continent', 'label')
+ERROR_FIELDS = GOLD_FIELDS[:-1]
+CONSISTENCY_FIELDS = ('rfc_id', 'original_address', 'human_country', 'human_continent',
+                      'run_1_country', 'run_1_continent', 'run_2_country', 'run_2_continent',
+                      'run_3_country', 'run_3_continent', 'unique_outputs', 'variance', 'consistent')
 
 SYSTEM_PROMPT = """Which country and continent is this address located in?
-Simply return a JSON object with two fields: "country" and "continent".
-Make sure the names are in consistent format.
-For example, dont use U.S for one address and United States of America for other.
-Write complete names only always.
+Return ONLY JSON: {"country": "full name", "continent": "full name"}
+Use consistent canonical names (e.g. "United States of America", not "US").
+
+Examples:
+"42 Example Street, Springfield, IL 62701" -> {"country": "United States of America", "continent": "North America"}
+"Estados Unidos" -> {"country": "United States of America", "continent": "North America"}
+"Kaiserstrasse 12, 60311 Frankfurt am Main" -> {"country": "Germany", "continent": "Europe"}
+"GB" -> {"country": "United Kingdom", "continent": "Europe"}
+"Wales" -> {"country": "United Kingdom", "continent": "Europe"}
+"PRC" -> {"country": "China", "continent": "Asia"}
+"ROK" -> {"country": "South Korea", "continent": "Asia"}
+"Moscow 125009" -> {"country": "Russia", "continent": "Europe"}
+"Holland" -> {"country": "Netherlands", "continent": "Europe"}
+"Pune 411001, Maharashtra" -> {"country": "India", "continent": "Asia"}
+"Abu Dhabi, UAE" -> {"country": "United Arab Emirates", "continent": "Asia"}
+"Sydney NSW 2000" -> {"country": "Australia", "continent": "Oceania"}
+"AR" -> {"country": "Argentina", "continent": "South America"}
+"KE" -> {"country": "Kenya", "continent": "Africa"}"""
+
+# OpenAI caches prompts on an exact prefix, so the system prompt is sent first and
+# never interpolated; the length check catches edits made without meaning to change it
+# (the cache key below includes the prompt, so a deliberate edit also resets the disk cache)
+SYSTEM_PROMPT_LEN = 1204
+assert len(SYSTEM_PROMPT) == SYSTEM_PROMPT_LEN, "SYSTEM_PROMPT changed: update SYSTEM_PROMPT_LEN"
+
+# Routes every request to the same prompt cache shard; a per-address key would scatter them
+PROMPT_CACHE_KEY = "address-gold-set"
+
+
+class DiskCache:
+    """Persistent key/value store for LLM responses, backed by SQLite"""
+    
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+    
+    def get(self, key):
+        row = self.conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        # (country, continent) pairs are stored as JSON arrays
+        return tuple(orjson.loads(row[0])) if row else None
+    
+    def set(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, orjson.dumps(value).decode()))
+        self.conn.commit()
+
+
+cache = DiskCache(CACHE_FILE)
+
+
+def canonical_address(address):
+    # "Milford, MA 01757 USA" and "milford ma  01757, usa" are the same address
+    return re.sub(r'[^\w]+', ' ', address.lower()).strip()
+
+
+def _canon(name):
+    # "united states of america" typed by the reviewer matches the LLM's "United States of America"
+    return name.strip().casefold()
+
+
+def cache_key(address, model, temperature, bulk=False):
+    # Bulk answers come from a different prompt shape, so they never stand in for a single-request answer
+    shape = "bulk" if bulk else "single"
+    return hashlib.sha256(f"{model}|{temperature}|{shape}|{SYSTEM_PROMPT}|{address}".encode()).hexdigest()
 
-Return ONLY the JSON object in this format:
-{"country": "country name", "continent": "continent name"}"""
 
+# Every client is built with max_retries=0, so this is the only retry policy
+@retry(
+    retry=retry_if_exception_type((RateLimitError, APITimeoutError, APIConnectionError)),
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(5),
+    reraise=True
+)
+async def create_completion(client, **kwargs):
+    """Chat completion with exponential backoff on 429 responses, timeouts and dropped connections"""
+    # Every attempt, retries included, takes a token from the bucket
+    async with rate_limiter():
+        return await client.chat.completions.create(**kwargs)
 
-def normalize_address(address, model="gpt-4.1", temperature=0):
+
+ADDRESS_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "address_location",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "country": {"type": "string"},
+                "continent": {"type": "string"}
+            },
+            "required": ["country", "continent"],
+            "additionalProperties": False
+        }
+    }
+}
+
+
+def request_body(address, model, temperature):
+    """Chat completion parameters, shared by the live and the Batch API paths"""
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": address}
+        ],
+        "temperature": temperature,
+        # Two place names plus the {"country": ..., "continent": ...} wrapper
+        "max_tokens": 40,
+        "prompt_cache_key": PROMPT_CACHE_KEY,
+        "response_format": ADDRESS_FORMAT
+    }
+
+
+def bulk_request_body(addresses, model, temperature):
+    """One request normalizing several addresses, answered as a JSON array in the same order"""
+    # The bulk instruction goes in the user turn so the system prompt prefix stays shared
+    # with the single-address requests
+    user_prompt = ("For each address in this JSON array, return a JSON array of objects with "
+                   "'country' and 'continent' in the same order:\n"
+                   + orjson.dumps(addresses).decode())
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        "temperature": temperature,
+        "max_tokens": 30 * len(addresses) + 20,
+        "prompt_cache_key": PROMPT_CACHE_KEY
+    }
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# An opening ``` or ```json and a closing ```, each with the whitespace around it
+_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.DOTALL)
+
+
+def strip_fences(content):
+    """Drop the ```json ... ``` fence the model sometimes wraps its JSON in"""
+    return _FENCE_RE.sub('', content).strip()
+
+
+def parse_address(content):
+    # The schema guarantees both fields; only a reply cut off at max_tokens fails here
+    result = orjson.loads(content)
+    return result['country'], result['continent']
+
+
+async def normalize_address(client, address, model="gpt-4.1", temperature=0):
+    key = cache_key(address, model, temperature)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    
     try:
-        user_prompt = address
+        response = await create_completion(client, **request_body(address, model, temperature))
+        result = parse_address(response.choices[0].message.content)
+    except Exception as e:
+        logger.warning(f"  Error processing '{address}': {e}")
+        return "ERROR", "ERROR"
+    
+    cache.set(key, result)
+    return result
+
+
+async def normalize_addresses_bulk(client, addresses, model="gpt-4.1", temperature=0, bypass_cache=False):
+    """Normalize a chunk of addresses in one request, returns {address: (country, continent)}"""
+    try:
+        response = await create_completion(client, **bulk_request_body(addresses, model, temperature))
+        rows = orjson.loads(strip_fences(response.choices[0].message.content))
+        if not isinstance(rows, list) or len(rows) != len(addresses):
+            raise ValueError(f"expected a JSON array of {len(addresses)} objects")
+    except Exception as e:
+        # The whole chunk is retried one by one by the caller, which isolates the bad address
+        logger.warning(f"  Error processing chunk of {len(addresses)} addresses: {e}")
+        return {}
+    
+    # Rows with a missing or blank field are left out and retried one by one by the caller
+    results = {}
+    for address, row in zip(addresses, rows):
+        if not isinstance(row, dict):
+            continue
+        country, continent = row.get('country'), row.get('continent')
+        if isinstance(country, str) and country.strip() and isinstance(continent, str) and continent.strip():
+            results[address] = (country.strip(), continent.strip())
+            # The consistency check leaves the cache alone so it only ever measures fresh responses
+            if not bypass_cache:
+                cache.set(cache_key(address, model, temperature, bulk=True), results[address])
+    return results
+
+
+async def embed_all(texts):
+    async with AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0) as client:
+        response = await client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    return [d.embedding for d in response.data]
+
+
+def merge_near_duplicates(cluster_map):
+    """Fold clusters whose representatives' embeddings are within FUZZY_THRESHOLD cosine similarity"""
+    # Optional dependency, only needed with --fuzzy-dedup
+    import numpy as np
+    
+    keys = list(cluster_map)
+    try:
+        vectors = np.asarray(asyncio.run(embed_all([cluster_map[k][0] for k in keys])), dtype='float32')
+    except Exception as e:
+        logger.warning(f"  Error embedding addresses, skipping fuzzy dedup: {e}")
+        return cluster_map
+    
+    # Dot products of unit vectors are cosine similarities
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    similarity = vectors @ vectors.T
+    
+    merged = {}
+    kept = []  # indices into keys of the clusters that stay, in input order
+    for i, key in enumerate(keys):
+        match = next((j for j in kept if similarity[i, j] > FUZZY_THRESHOLD), None)
+        if match is None:
+            kept.append(i)
+            merged[key] = list(cluster_map[key])
+        else:
+            merged[keys[match]].extend(cluster_map[key])
+    return merged
+
+
+async def run_triples(addresses, on_triple, temperature=0):
+    """Normalize each address 3 times through the bulk prompt with the cache bypassed, calling
+    on_triple(index, runs) as soon as all 3 runs of a BULK_SIZE chunk are back"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    
+    async with AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0) as client:
+        async def bounded(chunk):
+            async with semaphore:
+                return await normalize_addresses_bulk(client, chunk, temperature=temperature, bypass_cache=True)
+        
+        async def triple(chunk):
+            chunk_addresses = [address for _, address in chunk]
+            return chunk, await asyncio.gather(*(bounded(chunk_addresses) for _ in range(3)))
+        
+        tasks = [triple(chunk) for chunk in chunked(enumerate(addresses, 1), BULK_SIZE)]
+        for next_done in asyncio.as_completed(tasks):
+            chunk, runs = await next_done
+            # An address a run dropped counts as ERROR, like a failed single request
+            for idx, address in chunk:
+                on_triple(idx, [run.get(address, ("ERROR", "ERROR")) for run in runs])
+
+
+async def run_all_bulk(addresses, model="gpt-4.1", temperature=0):
+    """Normalize all addresses BULK_SIZE per request, at most MAX_CONCURRENT_REQUESTS requests at a time"""
+    results = {}
+    pending = []
+    for address in dict.fromkeys(addresses):
+        cached = cache.get(cache_key(address, model, temperature, bulk=True))
+        if cached is None:
+            cached = cache.get(cache_key(address, model, temperature))
+        if cached is not None:
+            results[address] = cached
+        else:
+            pending.append(address)
+    
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    
+    async with AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0) as client:
+        async def bounded(call, *args):
+            async with semaphore:
+                return await call(client, *args, model=model, temperature=temperature)
         
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=temperature,
-            max_tokens=100
-        )
+        tasks = [bounded(normalize_addresses_bulk, chunk) for chunk in chunked(pending, BULK_SIZE)]
+        for chunk_results in await asyncio.gather(*tasks):
+            results.update(chunk_results)
         
-        result = response.choices[0].message.content.strip()
+        missing = [a for a in pending if a not in results]
+        if missing:
+            logger.info(f"Retrying {len(missing)} addresses individually...")
+            tasks = [bounded(normalize_address, a) for a in missing]
+            results.update(zip(missing, await asyncio.gather(*tasks)))
+    
+    return [results[a] for a in addresses]
+
+
+def batch_normalize(addresses, model="gpt-4.1", temperature=0):
+    """Normalize addresses through the OpenAI Batch API (half price, up to 24h turnaround)"""
+    results = {}
+    pending = []
+    for address in dict.fromkeys(addresses):
+        cached = cache.get(cache_key(address, model, temperature))
+        if cached is not None:
+            results[address] = cached
+        else:
+            pending.append(address)
+    
+    if not pending:
+        return results
+    
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    
+    # custom_id is the index into pending, which maps straight back to the address
+    lines = [
+        orjson.dumps({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": request_body(address, model, temperature)
+        })
+        for i, address in enumerate(pending)
+    ]
+    batch_input = client.files.create(
+        file=("address_batch.jsonl", b"\n".join(lines)),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=batch_input.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    logger.info(f"Submitted batch {batch.id} with {len(pending)} requests")
+    
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(BATCH_POLL_INTERVAL)
+        batch = client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        logger.info(f"  Batch status: {batch.status} ({counts.completed if counts else 0}/{len(pending)} done)")
+    
+    if batch.status != "completed" or not batch.output_file_id:
+        logger.error(f"ERROR: Batch {batch.id} finished with status '{batch.status}'")
+        return results
+    
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        record = orjson.loads(line)
+        address = pending[int(record['custom_id'])]
+        response = record.get('response')
+        if record.get('error') or not response or response['status_code'] != 200:
+            logger.warning(f"  Error processing '{address}': {record.get('error') or response}")
+            continue
         
-        if result.startswith('```json'):
-            result = result.replace('```json', '').replace('```', '').strip()
-        elif result.startswith('```'):
-            result = result.replace('```', '').strip()
+        message = response['body']['choices'][0]['message']
+        if message.get('content') is None:
+            # Refusals come back with content null, which is not an unparseable reply
+            logger.warning(f"  Error processing '{address}': refused: {message.get('refusal')}")
+            continue
         
         try:
-            json_result = json.loads(result)
-            country = json_result.get('country', 'Unknown')
-            continent = json_result.get('continent', 'Unknown')
-            return country, continent
-        except json.JSONDecodeError:
-            print(f"  Warning: Could not parse JSON response: {result}")
-            return "ERROR", "ERROR"
-        
-    except Exception as e:
-        print(f"  Error processing '{address}': {e}")
-        return "ERROR", "ERROR"
+            result = parse_address(message['content'])
+        except (orjson.JSONDecodeError, KeyError) as e:
+            logger.warning(f"  Error processing '{address}': {e}")
+            continue
+        cache.set(cache_key(address, model, temperature), result)
+        results[address] = result
+    
+    return results
 
 
 def load_existing_gold_set():
     """Load existing address_gold_set.csv if it exists and has data"""
-    if not os.path.exists(output_file):
+    if not OUTPUT_FILE.exists():
         return None
     
     try:
         validated = []
-        with open(output_file, 'r', encoding='utf-8') as f:
+        with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row in reader:
                 validated.append(row)
@@ -76,95 +443,101 @@ def load_existing_gold_set():
         
         return validated
     except Exception as e:
-        print(f"Warning: Could not read existing address_gold_set.csv: {e}")
+        logger.warning(f"Warning: Could not read existing address_gold_set.csv: {e}")
         return None
 
 
-def save_error_samples(validated):
+def iter_addresses():
+    """Yield the rows of address_raw.csv one at a time"""
+    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        
+        if not fieldnames or 'rfc_id' not in fieldnames or 'original_address' not in fieldnames:
+            raise ValueError(f"CSV must have 'rfc_id' and 'original_address' columns, found: {fieldnames}")
+        
+        for row in reader:
+            yield {
+                'rfc_id': row['rfc_id'],
+                'original_address': row['original_address']
+            }
+
+
+def save_error_samples(error_cases):
     """Save ALL incorrect normalizations to address_error_samples.csv"""
-    error_cases = [v for v in validated if v['label'] == 'w']
-    
     if not error_cases:
-        print(f"\nNo error cases to save (all normalizations were correct!)")
+        logger.info(f"\nNo error cases to save (all normalizations were correct!)")
         return
     
     try:
-        with open(error_file, 'w', newline='', encoding='utf-8') as f:
-            fieldnames = ['rfc_id', 'original_address', 'llm_normalized_country', 
-                        'llm_normalized_continent', 'human_normalized_country', 
-                        'human_normalized_continent']
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(error_cases)
+        with open(ERROR_FILE, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(ERROR_FIELDS)
+            writer.writerows(tuple(c[k] for k in ERROR_FIELDS) for c in error_cases)
         
-        print(f"Error samples saved to: {error_file}")
-        print(f"Total error cases: {len(error_cases)}")
+        logger.info(f"Error samples saved to: {ERROR_FILE}")
+        logger.info(f"Total error cases: {len(error_cases)}")
     except Exception as e:
-        print(f"ERROR saving error samples: {e}")
+        logger.error(f"ERROR saving error samples: {e}")
 
 
 def print_statistics(validated):
-    N = len(validated)
-    r = sum(1 for v in validated if v['label'] == 'r')
-    w = N - r
+    # One pass splits the entries by label; every count below comes from these two lists
+    correct_cases, error_cases = [], []
+    for v in validated:
+        (correct_cases if v['label'] == 'r' else error_cases).append(v)
+    r, w = len(correct_cases), len(error_cases)
+    N = r + w
     accuracy = (r / N) * 100 if N > 0 else 0
     error_rate = (w / N) * 100 if N > 0 else 0
     
-    print(f"\n{'='*70}")
-    print(f"STATISTICAL VALIDATION")
-    print(f"{'='*70}")
-    print(f"N = Total number of manually evaluated entries: {N}")
-    print(f"R = Number of correct normalizations (label = r): {r}")
-    print(f"W = Number of incorrect normalizations (label = w): {w}")
+    logger.info(f"\n{BANNER}\nSTATISTICAL VALIDATION\n{BANNER}")
+    logger.info(f"N = Total number of manually evaluated entries: {N}")
+    logger.info(f"R = Number of correct normalizations (label = r): {r}")
+    logger.info(f"W = Number of incorrect normalizations (label = w): {w}")
     
-    print(f"\n{'='*70}")
-    print(f"1. ACCURACY")
-    print(f"{'='*70}")
-    print(f"Proportion of entries the LLM normalized correctly:")
-    print(f"Accuracy = R / N = {r} / {N} = {accuracy:.2f}%")
+    logger.info(f"\n{BANNER}\n1. ACCURACY\n{BANNER}")
+    logger.info(f"Proportion of entries the LLM normalized correctly:")
+    logger.info(f"Accuracy = R / N = {r} / {N} = {accuracy:.2f}%")
     
-    print(f"\n{'='*70}")
-    print(f"2. ERROR RATE")
-    print(f"{'='*70}")
-    print(f"Proportion of incorrect normalizations:")
-    print(f"Error Rate = W / N = {w} / {N} = {error_rate:.2f}%")
+    logger.info(f"\n{BANNER}\n2. ERROR RATE\n{BANNER}")
+    logger.info(f"Proportion of incorrect normalizations:")
+    logger.info(f"Error Rate = W / N = {w} / {N} = {error_rate:.2f}%")
     
-    save_error_samples(validated)
+    save_error_samples(error_cases)
     
     # Consistency Check
-    correct_cases = [v for v in validated if v['label'] == 'r']
     if len(correct_cases) >= 20:
-        print(f"\n{'='*70}")
-        print(f"CONSISTENCY CHECK")
-        print(f"{'='*70}")
+        logger.info(f"\n{BANNER}\nCONSISTENCY CHECK\n{BANNER}")
         
         if not os.getenv("OPENAI_API_KEY"):
-            print(f"Skipping consistency check: OPENAI_API_KEY not set")
+            logger.info(f"Skipping consistency check: OPENAI_API_KEY not set")
             return
         
-        print(f"Running consistency check on 20 correct samples...")
-        print(f"Testing each sample 3 times to measure variance...\n")
+        logger.info(f"Running consistency check on 20 correct samples...")
+        logger.info(f"Testing each sample 3 times through the bulk prompt to measure variance...\n")
         
         import random
         sample_cases = random.sample(correct_cases, min(20, len(correct_cases)))
         
+        try:
+            f = open(CONSISTENCY_FILE, 'w', newline='', encoding='utf-8')
+        except Exception as e:
+            logger.error(f"ERROR saving consistency check results: {e}")
+            return
+        
         consistency_results = []
-        inconsistent_count = 0
-        total_variance = 0
+        save_error = None
         
-        for idx, case in enumerate(sample_cases, 1):
+        def record_triple(idx, all_runs):
+            nonlocal save_error
+            case = sample_cases[idx - 1]
             rfc_id = case['rfc_id']
             original = case['original_address']
             human_country = case['human_normalized_country']
             human_continent = case['human_normalized_continent']
             
-            print(f"[{idx}/20] RFC: {rfc_id} - Testing: {original}")
-            
-            runs = []
-            for run in range(3):
-                country, continent = normalize_address(original, temperature=0)
-                runs.append({'country': country, 'continent': continent})
-                time.sleep(0.5)
+            runs = [{'country': country, 'continent': continent} for country, continent in all_runs]
             
             all_same = all(
                 r['country'] == runs[0]['country'] and r['continent'] == runs[0]['continent']
@@ -175,10 +548,6 @@ def print_statistics(validated):
             # Calculate variance: number of unique outputs
             unique_outputs = len(set((r['country'], r['continent']) for r in runs))
             variance = unique_outputs - 1
-            total_variance += variance
-            
-            if not all_same:
-                inconsistent_count += 1
             
             consistency_results.append({
                 'rfc_id': rfc_id,
@@ -195,207 +564,308 @@ def print_statistics(validated):
                 'variance': variance,
                 'consistent': 'Yes' if all_same else 'No'
             })
+            # Each sample is saved as soon as its 3 runs are back, so an interrupted check keeps them
+            if save_error is None:
+                try:
+                    writer.writerow(tuple(consistency_results[-1][k] for k in CONSISTENCY_FIELDS))
+                    f.flush()
+                except Exception as e:
+                    save_error = e
+                    logger.error(f"ERROR saving consistency check results: {e}")
             
-            print(f"  Run 1: {runs[0]['country']}, {runs[0]['continent']}")
-            print(f"  Run 2: {runs[1]['country']}, {runs[1]['continent']}")
-            print(f"  Run 3: {runs[2]['country']}, {runs[2]['continent']}")
-            print(f"  Unique outputs: {unique_outputs}, Variance: {variance}")
-            print(f"  {consistent}\n")
+            logger.info(
+                f"[{idx}/{len(sample_cases)}] RFC: {rfc_id} - Testing: {original}\n"
+                f"  Run 1: {runs[0]['country']}, {runs[0]['continent']}\n"
+                f"  Run 2: {runs[1]['country']}, {runs[1]['continent']}\n"
+                f"  Run 3: {runs[2]['country']}, {runs[2]['continent']}\n"
+                f"  Unique outputs: {unique_outputs}, Variance: {variance}\n"
+                f"  {consistent}\n"
+            )
         
-        # Calculate statistics
-        consistency_rate = ((20 - inconsistent_count) / 20) * 100
-        avg_variance = total_variance / 20
+        with f:
+            writer = csv.writer(f)
+            try:
+                writer.writerow(CONSISTENCY_FIELDS)
+            except Exception as e:
+                save_error = e
+                logger.error(f"ERROR saving consistency check results: {e}")
+            
+            try:
+                # The labeled answers come from the bulk prompt, so the 3 runs go through it as well
+                asyncio.run(run_triples([case['original_address'] for case in sample_cases], record_triple,
+                                        temperature=0))
+            except Exception as e:
+                # Samples that finished before the failure are still recorded and summarized below
+                logger.error(f"ERROR running consistency check: {e}")
         
-        print(f"{'='*70}")
-        print(f"CONSISTENCY RESULTS:")
-        print(f"{'='*70}")
-        print(f"Total samples tested: 20")
-        print(f"Consistent outputs (variance = 0): {20 - inconsistent_count}")
-        print(f"Inconsistent outputs (variance > 0): {inconsistent_count}")
-        print(f"Consistency rate: {consistency_rate:.1f}%")
-        print(f"\nVariance Metrics:")
-        print(f"  Total variance: {total_variance}")
-        print(f"  Average variance per sample: {avg_variance:.2f}")
-        print(f"  (Variance = number of unique outputs - 1)")
-        print(f"  (0 = all same, 1 = 2 different, 2 = all different)")
+        tested = len(consistency_results)
+        if not tested:
+            logger.info(f"No consistency check samples completed")
+            return
         
-        # Save consistency check results
-        try:
-            with open(consistency_file, 'w', newline='', encoding='utf-8') as f:
-                fieldnames = ['rfc_id', 'original_address', 'human_country', 'human_continent',
-                            'run_1_country', 'run_1_continent', 'run_2_country', 'run_2_continent',
-                            'run_3_country', 'run_3_continent', 'unique_outputs', 'variance', 'consistent']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(consistency_results)
-            print(f"\nConsistency check results saved to: {consistency_file}")
-        except Exception as e:
-            print(f"ERROR saving consistency check results: {e}")
+        # Calculate statistics
+        inconsistent_count = sum(1 for c in consistency_results if c['consistent'] == 'No')
+        total_variance = sum(c['variance'] for c in consistency_results)
+        consistency_rate = ((tested - inconsistent_count) / tested) * 100
+        avg_variance = total_variance / tested
+        
+        logger.info(f"{BANNER}\nCONSISTENCY RESULTS:\n{BANNER}")
+        logger.info(f"Total samples tested: {tested}")
+        logger.info(f"Consistent outputs (variance = 0): {tested - inconsistent_count}")
+        logger.info(f"Inconsistent outputs (variance > 0): {inconsistent_count}")
+        logger.info(f"Consistency rate: {consistency_rate:.1f}%")
+        logger.info(f"\nVariance Metrics:")
+        logger.info(f"  Total variance: {total_variance}")
+        logger.info(f"  Average variance per sample: {avg_variance:.2f}")
+        logger.info(f"  (Variance = number of unique outputs - 1)")
+        logger.info(f"  (0 = all same, 1 = 2 different, 2 = all different)")
+        if save_error is None:
+            logger.info(f"\nConsistency check results saved to: {CONSISTENCY_FILE}")
     else:
-        print(f"\n{'='*70}")
-        print(f"CONSISTENCY CHECK")
-        print(f"{'='*70}")
-        print(f"Not enough correct samples for consistency check (need 20, have {len(correct_cases)})")
-
-
-def validate_normalizations():
-    existing_data = load_existing_gold_set()
-    if existing_data is not None:
-        print(f"\n{'='*70}")
-        print(f"EXISTING GOLD SET FOUND")
-        print(f"{'='*70}\n")
-        print(f"Found {len(existing_data)} entries in {output_file}")
-        print(f"Proceeding directly to statistics and analysis...\n")
-        print_statistics(existing_data)
-        return
+        logger.info(f"\n{BANNER}\nCONSISTENCY CHECK\n{BANNER}")
+        logger.info(f"Not enough correct samples for consistency check (need 20, have {len(correct_cases)})")
+
+
+def normalize_all(use_batch=False, fuzzy_dedup=False, confirm=False):
+    """Phase 1: write the LLM's answer for every address not yet in the gold set to address_prevalidated.csv"""
+    existing_data = load_existing_gold_set() or []
+    # Entries already in the gold set are skipped, so a session ended with 'quit'
+    # resumes where it stopped instead of paying for those addresses again
+    done = {row['rfc_id'] for row in existing_data}
     
-    # If no existing data, proceed with validation
-    print(f"NO EXISTING GOLD SET FOUND")
-    print(f"Proceeding with human validation...\n")
+    if not INPUT_FILE.exists():
+        # An existing gold set can still be reviewed and analysed without the raw input
+        if existing_data:
+            return True
+        logger.error(f"ERROR: Input file not found: {INPUT_FILE}")
+        return False
     
-    if not os.path.exists(input_file):
-        print(f"ERROR: Input file not found: {input_file}")
-        return
+    try:
+        addresses = [a for a in iter_addresses() if a['rfc_id'] not in done]
+    except Exception as e:
+        logger.error(f"ERROR reading input file: {e}")
+        return False
+    
+    if not addresses:
+        if existing_data:
+            logger.info(f"All {len(existing_data)} addresses are already in {OUTPUT_FILE}, nothing to normalize")
+            return True
+        logger.error("ERROR: No addresses found in input file")
+        return False
     
     if not os.getenv("OPENAI_API_KEY"):
-        print("ERROR: OPENAI_API_KEY environment variable not set!")
-        print("Set it with: export OPENAI_API_KEY='your-key-here'")
-        return
+        logger.error("ERROR: OPENAI_API_KEY environment variable not set!\n"
+                     "Set it with: export OPENAI_API_KEY='your-key-here'")
+        return False
+    
+    logger.info(f"\n{BANNER}\nADDRESS NORMALIZATION\n{BANNER}")
+    logger.info(f"Total addresses: {len(addresses)}")
+    if existing_data:
+        logger.info(f"Already validated: {len(existing_data)} (skipped)")
+    logger.info(f"Model: gpt-4.1")
+    if use_batch:
+        logger.info(f"Mode: Batch API (results may take up to 24h)")
+    
+    if confirm:
+        response = input(f"\nProceed with GPT-4.1 normalization and validation? (y/n): ")
+        if response.lower() != 'y':
+            logger.info("Cancelled.")
+            return False
+    
+    logger.info(f"Getting LLM normalizations for {len(addresses)} addresses...")
+    # Addresses differing only in case, punctuation or spacing are normalized once
+    # and the answer is shared by every spelling in the cluster
+    cluster_map = {}
+    for a in addresses:
+        cluster_map.setdefault(canonical_address(a['original_address']), []).append(a['original_address'])
+    if fuzzy_dedup:
+        cluster_map = merge_near_duplicates(cluster_map)
+    representatives = [raws[0] for raws in cluster_map.values()]
+    logger.info(f"{len(representatives)} distinct addresses after deduplication")
     
-    addresses = []
+    if use_batch:
+        llm_results = batch_normalize(representatives, temperature=0)
+    else:
+        llm_results = dict(zip(representatives, asyncio.run(run_all_bulk(representatives, temperature=0))))
+    llm_normalizations = {
+        raw: llm_results.get(raws[0], ("ERROR", "ERROR"))
+        for raws in cluster_map.values()
+        for raw in raws
+    }
+    
+    # Same columns as the gold set, with the human columns and the label left for the review
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
-            
-            if not fieldnames or 'rfc_id' not in fieldnames or 'original_address' not in fieldnames:
-                print("ERROR: CSV must have 'rfc_id' and 'original_address' columns")
-                print(f"Found columns: {fieldnames}")
-                return
-            
-            for row in reader:
-                addresses.append({
-                    'rfc_id': row['rfc_id'],
-                    'original_address': row['original_address']
-                })
+        with open(PREVALIDATED_FILE, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(GOLD_FIELDS)
+            writer.writerows(
+                (a['rfc_id'], a['original_address'], *llm_normalizations[a['original_address']], '', '', '')
+                for a in addresses
+            )
     except Exception as e:
-        print(f"ERROR reading input file: {e}")
+        logger.error(f"ERROR saving prevalidated file: {e}")
+        return False
+    
+    logger.info(f"LLM normalizations saved to: {PREVALIDATED_FILE}")
+    return True
+
+
+def review():
+    """Phase 2: label the prevalidated addresses by hand, appending each answer to address_gold_set.csv"""
+    existing_data = load_existing_gold_set() or []
+    done = {row['rfc_id'] for row in existing_data}
+    
+    pending = []
+    if PREVALIDATED_FILE.exists():
+        try:
+            with open(PREVALIDATED_FILE, 'r', encoding='utf-8') as f:
+                pending = [row for row in csv.DictReader(f) if row['rfc_id'] not in done]
+        except Exception as e:
+            logger.error(f"ERROR reading prevalidated file: {e}")
+            return
+    
+    if existing_data and not pending:
+        logger.info(f"\n{BANNER}\nEXISTING GOLD SET FOUND\n{BANNER}\n")
+        logger.info(f"Found {len(existing_data)} entries in {OUTPUT_FILE}")
+        logger.info(f"Proceeding directly to statistics and analysis...\n")
+        print_statistics(existing_data)
         return
     
-    if not addresses:
-        print("ERROR: No addresses found in input file")
+    if not pending:
+        logger.error(f"ERROR: Nothing to review in {PREVALIDATED_FILE}\n"
+                     f"Run normalize_all.py first to get the LLM normalizations")
         return
     
-    print(f"\n{'='*70}")
-    print(f"ADDRESS NORMALIZATION & VALIDATION")
-    print(f"{'='*70}")
-    print(f"Total addresses: {len(addresses)}")
-    print(f"Model: gpt-4.1")
+    if existing_data:
+        logger.info(f"RESUMING EXISTING GOLD SET")
+        logger.info(f"{len(existing_data)} entries already validated, {len(pending)} left\n")
+    else:
+        logger.info(f"NO EXISTING GOLD SET FOUND")
+        logger.info(f"Proceeding with human validation...\n")
     
-    validated = []
+    # Statistics at the end cover the entries from earlier sessions too
+    validated = list(existing_data)
     
-    response = input(f"\nProceed with GPT-4.1 normalization and validation? (y/n): ")
-    if response.lower() != 'y':
-        print("Cancelled.")
+    logger.info(
+        f"\n{BANNER}\n"
+        f"VALIDATION INSTRUCTIONS:\n"
+        f"  - Review LLM's country and continent extraction\n"
+        f"  - Enter correct country and continent (comma-separated)\n"
+        f"  - Press ENTER if LLM is completely correct (label = r)\n"
+        f"  - Type 'quit' to save and exit\n"
+        f"  - Label = r ONLY if BOTH country AND continent are correct\n"
+        f"{BANNER}\n"
+    )
+    
+    # Write the header once, then append one row per validation
+    try:
+        f = open(OUTPUT_FILE, 'a' if existing_data else 'w', newline='', encoding='utf-8')
+    except Exception as e:
+        logger.error(f"ERROR saving output file: {e}")
         return
     
-    print(f"\n{'='*70}")
-    print(f"VALIDATION INSTRUCTIONS:")
-    print(f"  - Review LLM's country and continent extraction")
-    print(f"  - Enter correct country and continent (comma-separated)")
-    print(f"  - Press ENTER if LLM is completely correct (label = r)")
-    print(f"  - Type 'quit' to save and exit")
-    print(f"  - Label = r ONLY if BOTH country AND continent are correct")
-    print(f"{'='*70}\n")
-    
-    for i in range(len(addresses)):
-        rfc_id = addresses[i]['rfc_id']
-        original = addresses[i]['original_address']
-        
-        print(f"\n[{i+1}/{len(addresses)}] " + "="*50)
-        print(f"RFC: {rfc_id}")
-        print(f"Processing: {original}")
-        
-        print("Getting LLM normalization...")
-        llm_country, llm_continent = normalize_address(original, temperature=0)
-        
-        if llm_country == "ERROR" or llm_continent == "ERROR":
-            print("ERROR: Failed to get LLM normalization. Skipping this entry.")
-            response = input("Press ENTER to continue or 'quit' to exit: ")
-            if response.lower() == 'quit':
-                break
-            continue
-        
-        print(f"\nOriginal:        {original}")
-        print(f"LLM Country:     {llm_country}")
-        print(f"LLM Continent:   {llm_continent}")
-        print("-"*60)
-        
-        human_input = input("Correct normalization (ENTER if correct, or type 'country, continent'): ").strip()
+    with f:
+        # A plain writer over rows in GOLD_FIELDS order skips DictWriter's per-field lookups
+        writer = csv.writer(f)
+        if not existing_data:
+            writer.writerow(GOLD_FIELDS)
+            f.flush()
         
-        if human_input.lower() == 'quit':
-            print(f"\nSaving progress... Validated {len(validated)} out of {len(addresses)}.")
-            break
-        
-        if not human_input:
-            # User pressed ENTER - LLM is correct for both
-            human_country = llm_country
-            human_continent = llm_continent
-            label = 'r'
-            print("✓ LLM correct (label = r)")
-        else:
-            parts = [p.strip() for p in human_input.split(',')]
-            if len(parts) != 2:
-                print("ERROR: Please enter 'country, continent' separated by comma")
-                i -= 1  
+        for i in range(len(pending)):
+            rfc_id = pending[i]['rfc_id']
+            original = pending[i]['original_address']
+            
+            logger.info(f"\n[{i+1}/{len(pending)}] {'='*50}\nRFC: {rfc_id}\nProcessing: {original}")
+            
+            llm_country = pending[i]['llm_normalized_country']
+            llm_continent = pending[i]['llm_normalized_continent']
+            if llm_country == "ERROR" or llm_continent == "ERROR":
+                logger.error("ERROR: Failed to get LLM normalization. Skipping this entry.")
+                response = input("Press ENTER to continue or 'quit' to exit: ")
+                if response.lower() == 'quit':
+                    break
                 continue
             
-            human_country = parts[0]
-            human_continent = parts[1]
+            # One write per entry instead of one per line
+            logger.info(
+                f"\nOriginal:        {original}\n"
+                f"LLM Country:     {llm_country}\n"
+                f"LLM Continent:   {llm_continent}\n"
+                f"{'-'*60}"
+            )
+            
+            human_input = input("Correct normalization (ENTER if correct, or type 'country, continent'): ").strip()
+            
+            if human_input.lower() == 'quit':
+                logger.info(f"\nSaving progress... Validated {len(validated)} out of {len(existing_data) + len(pending)}.")
+                break
             
-            if human_country == llm_country and human_continent == llm_continent:
+            if not human_input:
+                # User pressed ENTER - LLM is correct for both
+                human_country = llm_country
+                human_continent = llm_continent
                 label = 'r'
-                print("✓ LLM correct (label = r)")
+                logger.info("✓ LLM correct (label = r)")
             else:
-                label = 'w'
-                print("✗ LLM incorrect (label = w)")
-        
-        validated.append({
-            'rfc_id': rfc_id,
-            'original_address': original,
-            'llm_normalized_country': llm_country,
-            'llm_normalized_continent': llm_continent,
-            'human_normalized_country': human_country,
-            'human_normalized_continent': human_continent,
-            'label': label
-        })
-        
-        try:
-            with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                fieldnames = ['rfc_id', 'original_address', 'llm_normalized_country', 
-                            'llm_normalized_continent', 'human_normalized_country', 
-                            'human_normalized_continent', 'label']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(validated)
-        except Exception as e:
-            print(f"ERROR saving output file: {e}")
-            return
+                parts = [p.strip() for p in human_input.split(',')]
+                if len(parts) != 2:
+                    logger.error("ERROR: Please enter 'country, continent' separated by comma")
+                    i -= 1  
+                    continue
+                
+                human_country = parts[0]
+                human_continent = parts[1]
+                
+                # Compared case-insensitively; the CSV keeps what was typed
+                if _canon(human_country) == _canon(llm_country) and _canon(human_continent) == _canon(llm_continent):
+                    label = 'r'
+                    logger.info("✓ LLM correct (label = r)")
+                else:
+                    label = 'w'
+                    logger.info("✗ LLM incorrect (label = w)")
+            
+            validated.append({
+                'rfc_id': rfc_id,
+                'original_address': original,
+                'llm_normalized_country': llm_country,
+                'llm_normalized_continent': llm_continent,
+                'human_normalized_country': human_country,
+                'human_normalized_continent': human_continent,
+                'label': label
+            })
+            
+            # Save after each validation, synced so a crash loses at most the current entry
+            try:
+                writer.writerow([validated[-1][k] for k in GOLD_FIELDS])
+                f.flush()
+                os.fsync(f.fileno())
+            except Exception as e:
+                logger.error(f"ERROR saving output file: {e}")
+                return
         
-        if i < len(addresses) - 1:
-            time.sleep(0.3)
-    
     if validated:
         print_statistics(validated)
     
-    print(f"\n{'='*70}")
-    print(f"OUTPUT FILES GENERATED")
-    print(f"{'='*70}")
-    print(f"1. Gold set: {output_file}")
-    print(f"2. Error samples: {error_file}")
-    print(f"3. Consistency check: {consistency_file}")
-    print(f"{'='*70}\n")
+    logger.info(
+        f"\n{BANNER}\nOUTPUT FILES GENERATED\n{BANNER}\n"
+        f"1. Gold set: {OUTPUT_FILE}\n"
+        f"2. Error samples: {ERROR_FILE}\n"
+        f"3. Consistency check: {CONSISTENCY_FILE}\n"
+        f"{BANNER}\n"
+    )
+
+
+def validate_normalizations(use_batch=False, fuzzy_dedup=False):
+    """Both phases in one session; the review only starts once every LLM answer is in"""
+    if normalize_all(use_batch=use_batch, fuzzy_dedup=fuzzy_dedup, confirm=True):
+        review()
 
 
 if __name__ == "__main__":
-    validate_normalizations()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build and evaluate the address geolocalization gold set")
+    parser.add_argument("--batch", action="store_true",
+                        help="normalize through the OpenAI Batch API (50%% cheaper, up to 24h turnaround)")
+    parser.add_argument("--fuzzy-dedup", action="store_true",
+                        help="also merge near-duplicate addresses by embedding similarity (needs numpy)")
+    args = parser.parse_args()
+    validate_normalizations(use_batch=args.batch, fuzzy_dedup=args.fuzzy_dedup)
\ No newline at end of file
@@ -0,0 +1,14 @@
+import argparse
+from gold_set_generation import normalize_all
+
+# Phase 1 of the gold set: every LLM call happens here, with no prompts, so it can run
+# unattended (or as a Batch API job) before anyone sits down to review with review.py
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize the addresses still to validate into address_prevalidated.csv")
+    parser.add_argument("--batch", action="store_true",
+                        help="normalize through the OpenAI Batch API (50%% cheaper, up to 24h turnaround)")
+    parser.add_argument("--fuzzy-dedup", action="store_true",
+                        help="also merge near-duplicate addresses by embedding similarity (needs numpy)")
+    args = parser.parse_args()
+    normalize_all(use_batch=args.batch, fuzzy_dedup=args.fuzzy_dedup)
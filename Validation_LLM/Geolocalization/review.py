@@ -0,0 +1,7 @@
+from gold_set_generation import review
+
+# Phase 2 of the gold set: labels the answers normalize_all.py saved, so no prompt waits
+# on the API; only the consistency check at the end makes requests
+
+if __name__ == "__main__":
+    review()